@@ -6,18 +6,106 @@ This script connects to HashiCorp's Terraform MCP Server and validates
 Terraform plans against the official Terraform Registry.
 """
 
+import atexit
+import functools
+import http.client
 import json
+import operator
+import queue
 import subprocess
 import sys
 import os
 import re
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+import threading
+import time
+import urllib.parse
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import chain, count
+from typing import Deque, Dict, IO, Iterator, List, Optional, Any, Tuple, Union
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+try:
+    import hcl2
+except ImportError:  # python-hcl2 is optional; fall back to scanning required_providers blocks
+    hcl2 = None
+
 # MCP Server Docker image
 MCP_SERVER_IMAGE = "hashicorp/terraform-mcp-server:latest"
 
+# URL of an already-running MCP server using the streamable HTTP transport
+# (e.g. http://localhost:8080/mcp). When unset, the server is run in Docker over stdio.
+MCP_SERVER_URL = os.getenv('MCP_SERVER_URL', '')
+
+# Seconds to wait for a single JSON-RPC response from the MCP server
+MCP_REQUEST_TIMEOUT = 30
+
+# Maximum number of MCP lookups to run concurrently, and of requests in flight
+MCP_MAX_WORKERS = 8
+
+# Report providers pinned in .terraform.lock.hcl with only their locked
+# version, skipping the registry lookup for the latest one
+MCP_LOCKED_VERSIONS_ONLY = os.getenv('MCP_LOCKED_VERSIONS_ONLY', '').lower() in ('1', 'true', 'yes')
+
+# On-disk cache for registry lookups, shared between runs (MCP_CACHE_TTL=0 disables it)
+MCP_CACHE_DIR = Path(os.getenv('MCP_CACHE_DIR', Path.home() / '.cache' / 'terraform-mcp-validator'))
+# (MCP_CACHE_TTL itself is read once logging is set up, so a bad value can be reported)
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+# Fields read from each module block returned by the search_modules tool
+MODULE_FIELDS = frozenset(("module_id", "Name", "Description"))
+
+# Plan actions tallied in the report, in report order, plus a set for membership tests
+PLAN_ACTIONS = ("create", "update", "delete", "replace")
+PLAN_ACTION_SET = frozenset(PLAN_ACTIONS)
+# Pulls all four counts out of an actions dict in a single call
+get_action_counts = operator.itemgetter(*PLAN_ACTIONS)
+
+# Regular expressions compiled once rather than per call / per loop iteration
+# Any leading word before an underscore, as used for registry resource lookups
+RESOURCE_PREFIX_RE = re.compile(r'^(\w+)_')
+# required_providers blocks and their entries, matched on raw file bytes:
+# provider_name = { source = "namespace/provider", version = "..." }
+REQUIRED_PROVIDERS_RE = re.compile(rb'required_providers\s*\{')
+# Braces plus the strings and comments that may contain braces, for finding the end of a block
+HCL_BRACE_TOKEN_RE = re.compile(rb'"(?:\\.|[^"\\])*"|#[^\n]*|//[^\n]*|/\*.*?\*/|[{}]', re.DOTALL)
+PROVIDER_SOURCE_RE = re.compile(
+    rb'(\w+)\s*=\s*\{[^}]*source\s*=\s*["\']([^"\']+)["\']',
+    re.MULTILINE | re.DOTALL
+)
+# provider blocks in .terraform.lock.hcl and the exact version each one is locked to:
+# provider "registry.terraform.io/hashicorp/aws" { version = "5.1.0" ... }
+LOCKFILE_PROVIDER_RE = re.compile(
+    rb'provider\s+"(?:[^"/]+/)?([^"/]+)/([^"/]+)"\s*\{[^}]*?\bversion\s*=\s*"([^"]+)"'
+)
+# Common error indicators in terraform plan output, as a single alternation
+PLAN_ERROR_RE = re.compile(
+    rb'Error:|Error configuring|Failed to|authentication|credentials|AccessDenied',
+    re.IGNORECASE
+)
+# Lower-cased substrings, at least one of which every PLAN_ERROR_RE match contains
+PLAN_ERROR_TOKENS = (b'error', b'failed to', b'authentication', b'credentials', b'accessdenied')
+
+# Prefer orjson for the large plan file and MCP traffic when it is installed.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so error handling is shared.
+# json_encode returns UTF-8 bytes, ready to write to a pipe or socket.
+if orjson is not None:
+    json_loads = orjson.loads
+    json_encode = orjson.dumps
+else:
+    json_loads = json.loads
+
+    def json_encode(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
 # Configure logging
 LOG_LEVEL = os.getenv('DEBUG', '').lower() in ('1', 'true', 'yes')
 logging.basicConfig(
@@ -27,19 +115,359 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Request ID counter for JSON-RPC
-_request_id_counter = 0
+try:
+    MCP_CACHE_TTL = int(os.getenv('MCP_CACHE_TTL', DEFAULT_CACHE_TTL))
+except ValueError:
+    logger.warning(f"Ignoring invalid MCP_CACHE_TTL {os.getenv('MCP_CACHE_TTL')!r}; expected seconds, using {DEFAULT_CACHE_TTL}")
+    MCP_CACHE_TTL = DEFAULT_CACHE_TTL
+
+# Request ID counter for JSON-RPC; count.__next__ runs in C, so it is
+# safe to call from the lookup threads without a lock
+get_next_request_id = count(1).__next__
+
+
+@contextmanager
+def open_atomic(path: Union[str, Path], buffering: int = -1) -> Iterator[IO[str]]:
+    """Open ``path`` for writing via a temporary file that replaces it on success.
+    
+    Readers never see a half-written file; if writing fails the original is
+    left untouched and the temporary file is removed.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', buffering=buffering) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
 
+class DiskCache:
+    """A small JSON file cache whose entries expire after ``ttl`` seconds.
 
-def get_next_request_id() -> int:
-    """Get the next unique request ID for JSON-RPC."""
-    global _request_id_counter
-    _request_id_counter += 1
-    return _request_id_counter
+    The file is read on first access and written back atomically by
+    ``save()``, which is registered to run at exit.
+    """
+
+    def __init__(self, path: Path, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                if isinstance(entries, dict):
+                    self._entries = entries
+                    logger.debug(f"Loaded {len(entries)} cached registry entries from {self.path}")
+                else:
+                    logger.debug(f"Ignoring registry cache {self.path}: expected a JSON object")
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.debug(f"Ignoring unreadable registry cache {self.path}: {e}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key``, or None if missing or expired."""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            # Entries of the wrong shape (e.g. a hand-edited file) count as expired
+            timestamp = entry.get("timestamp") if isinstance(entry, dict) else None
+            if not isinstance(timestamp, (int, float)) or time.time() - timestamp >= self.ttl:
+                del entries[key]
+                self._dirty = True
+                return None
+            return entry.get("value")
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value`` under ``key`` with the current timestamp."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._load()[key] = {"timestamp": time.time(), "value": value}
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache back to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open_atomic(self.path) as f:
+                    json.dump(self._entries, f)
+                self._dirty = False
+                logger.debug(f"Saved {len(self._entries)} registry entries to {self.path}")
+            except OSError as e:
+                logger.warning(f"Could not write registry cache {self.path}: {e}")
+
+
+_registry_cache = DiskCache(MCP_CACHE_DIR / "registry.json", MCP_CACHE_TTL)
+atexit.register(_registry_cache.save)
+
+
+class MCPClient:
+    """A single long-lived MCP server container spoken to over stdio.
+
+    The container is started once with ``docker run --rm -i`` and kept running
+    for the lifetime of the script, so every JSON-RPC request is one
+    newline-delimited round trip instead of a fresh container start-up.
+
+    Responses are routed back to callers by JSON-RPC id, so the client can be
+    shared between threads with several requests in flight at once.
+    """
+
+    def __init__(self, image: str = MCP_SERVER_IMAGE, capture_stderr: bool = LOG_LEVEL):
+        self.image = image
+        # Without DEBUG the stderr output is never shown, so it is discarded
+        # rather than piped and drained by a reader thread
+        self.capture_stderr = capture_stderr
+        self.process: Optional[subprocess.Popen] = None
+        self._pending: Dict[int, "queue.Queue[Optional[Dict[str, Any]]]"] = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._eof = False
+        self._stderr_tail: Deque[str] = deque(maxlen=20)
+
+    def start(self) -> None:
+        """Start the MCP server container and its output reader threads."""
+        logger.debug(f"Starting MCP server container: {self.image}")
+        self.process = subprocess.Popen(
+            ["docker", "run", "--rm", "-i", self.image],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE if self.capture_stderr else subprocess.DEVNULL
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        if self.capture_stderr:
+            threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def is_running(self) -> bool:
+        """Return True if the container is alive and its stdout is still open."""
+        return self.process is not None and not self._eof and self.process.poll() is None
+
+    def exit_code(self, timeout: float = 1.0) -> Optional[int]:
+        """Return the container's exit code, waiting up to ``timeout`` for it to be reaped.
+        
+        Stdout reaches EOF slightly before the process can be reaped, so a bare
+        poll() at that point usually still reports None.
+        """
+        try:
+            return self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def _read_stdout(self) -> None:
+        """Parse each stdout line and hand it to the request waiting on its id."""
+        try:
+            for line in self.process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json_loads(line)
+                except ValueError:  # JSONDecodeError, or UnicodeDecodeError without orjson
+                    message = None
+                if not isinstance(message, dict):
+                    logger.debug(f"Ignoring non-JSON-RPC output from MCP server: {line[:200].decode('utf-8', 'replace')}")
+                    continue
+
+                with self._pending_lock:
+                    waiter = self._pending.get(message.get("id"))
+                if waiter is not None:
+                    waiter.put(message)
+                else:
+                    # Notifications or late responses to requests that already timed out
+                    logger.debug(f"Skipping unrelated MCP message: {line[:200].decode('utf-8', 'replace')}")
+        finally:
+            # However the reader stops, wake every waiting request so it fails
+            # fast instead of timing out, and let is_running() report it
+            with self._pending_lock:
+                self._eof = True
+                for waiter in self._pending.values():
+                    waiter.put(None)
+
+    def _read_stderr(self) -> None:
+        """Drain stderr so the server never blocks on a full pipe."""
+        for raw_line in self.process.stderr:
+            line = raw_line.decode('utf-8', 'replace').rstrip()
+            self._stderr_tail.append(line)
+            logger.debug(f"MCP server stderr: {line}")
+
+    def stderr_tail(self) -> str:
+        """Return the most recent stderr lines for error reporting."""
+        if not self.capture_stderr:
+            return "(enable DEBUG=1 to see docker stderr)"
+        return "\n".join(self._stderr_tail)
+
+    def request(self, request: Dict[str, Any], timeout: float = MCP_REQUEST_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Send a JSON-RPC request and wait for the response with the same id.
+
+        Safe to call from several threads at once. Returns None if the server
+        exits before answering. Raises subprocess.TimeoutExpired if no
+        response arrives within ``timeout``.
+        """
+        request_id = request["id"]
+        waiter: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=1)
+        with self._pending_lock:
+            if self._eof:
+                return None
+            self._pending[request_id] = waiter
+
+        try:
+            with self._write_lock:
+                self.process.stdin.write(json_encode(request) + b"\n")
+                self.process.stdin.flush()
+            try:
+                return waiter.get(timeout=timeout)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(self.process.args, timeout)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def close(self) -> None:
+        """Stop the MCP server container, letting it exit on EOF before forcing it."""
+        if not self.is_running():
+            return
+        # Closing stdin is the stdio transport's shutdown signal
+        with self._write_lock:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+            return
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class MCPHTTPClient:
+    """Talks JSON-RPC to an already-running MCP server over streamable HTTP.
+
+    Each thread keeps its own keep-alive connection, so concurrent lookups
+    reuse sockets rather than reconnecting for every request.
+    """
+
+    def __init__(self, url: str):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.netloc = parts.netloc
+        self.path = parts.path or "/"
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.session_id: Optional[str] = None
+        self._local = threading.local()
+
+    def _connection(self, timeout: float) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self.connection_class(self.netloc, timeout=timeout)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self, connection: http.client.HTTPConnection) -> None:
+        connection.close()
+        self._local.connection = None
+
+    def _post(self, body: bytes, headers: Dict[str, str], timeout: float) -> Tuple[http.client.HTTPResponse, bytes]:
+        # Any failure mid-exchange (a timeout, a partial read) leaves http.client
+        # unable to reuse the connection, so it is dropped before re-raising.
+        # A keep-alive connection may also have been closed by the server while
+        # idle; that case is retried once on a fresh connection.
+        for attempt in range(2):
+            connection = self._connection(timeout)
+            try:
+                connection.request("POST", self.path, body=body, headers=headers)
+                response = connection.getresponse()
+                return response, response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._drop_connection(connection)
+                if attempt:
+                    raise
+            except Exception:
+                self._drop_connection(connection)
+                raise
+
+    def request(self, request: Dict[str, Any], timeout: float = MCP_REQUEST_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """POST a JSON-RPC request and return the response with the same id.
+
+        Raises TimeoutError if the server does not answer within ``timeout``.
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream"
+        }
+        if self.session_id:
+            headers["Mcp-Session-Id"] = self.session_id
+
+        response, payload = self._post(json_encode(request), headers, timeout)
+
+        session_id = response.getheader("Mcp-Session-Id")
+        if session_id:
+            self.session_id = session_id
+        if response.status >= 400:
+            raise ConnectionError(f"MCP server at {self.url} returned HTTP {response.status}: {payload[:200]!r}")
+
+        if not response.getheader("Content-Type", "").startswith("text/event-stream"):
+            return json_loads(payload)
+
+        # Server-sent events: the response is carried in one of the "data:" lines
+        for line in payload.splitlines():
+            if line.startswith(b"data:"):
+                message = json_loads(line[5:])
+                if message.get("id") == request["id"]:
+                    return message
+        raise ConnectionError(f"MCP server at {self.url} sent no response for request {request['id']}")
+
+
+_mcp_client: Optional[Union[MCPClient, MCPHTTPClient]] = None
+# Bounds in-flight requests however many threads are issuing lookups
+_mcp_inflight = threading.BoundedSemaphore(MCP_MAX_WORKERS)
+_mcp_client_lock = threading.Lock()
+
+
+def get_mcp_client() -> Union[MCPClient, MCPHTTPClient]:
+    """Return the shared MCP client, starting the server container if needed."""
+    global _mcp_client
+    with _mcp_client_lock:
+        if MCP_SERVER_URL:
+            if _mcp_client is None:
+                logger.debug(f"Using MCP server at {MCP_SERVER_URL}")
+                _mcp_client = MCPHTTPClient(MCP_SERVER_URL)
+        elif _mcp_client is None or not _mcp_client.is_running():
+            if _mcp_client is not None:
+                exit_code = _mcp_client.exit_code()
+                status = f" (exit code {exit_code})" if exit_code is not None else ""
+                logger.warning(f"MCP server container exited{status}; starting a new one")
+            client = MCPClient()
+            client.start()
+            atexit.register(client.close)
+            _mcp_client = client
+        return _mcp_client
 
 
 def send_mcp_request(method: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-    """Send a JSON-RPC request to the MCP server via Docker stdio."""
+    """Send a JSON-RPC request to the shared MCP server (stdio or HTTP)."""
     request_id = get_next_request_id()
     request = {
         "jsonrpc": "2.0",
@@ -51,72 +479,102 @@ def send_mcp_request(method: str, params: Dict[str, Any] = None) -> Dict[str, An
         request["params"] = params
     
     try:
-        logger.debug(f"Sending MCP request: method={method}, id={request_id}")
-        if LOG_LEVEL:
-            logger.debug(f"Request params: {json.dumps(params) if params else 'None'}")
-        
-        process = subprocess.Popen(
-            ["docker", "run", "--rm", "-i", MCP_SERVER_IMAGE],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        # Hot path: let logging format lazily and only serialize when DEBUG is on
+        logger.debug("Sending MCP request: method=%s, id=%d", method, request_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request params: %s", json.dumps(params) if params else 'None')
         
-        request_json = json.dumps(request) + "\n"
-        stdout, stderr = process.communicate(input=request_json, timeout=30)
+        client = get_mcp_client()
+        try:
+            with _mcp_inflight:
+                response = client.request(request)
+        except BrokenPipeError:
+            response = None
         
-        if process.returncode != 0:
-            logger.error(f"MCP server returned non-zero exit code {process.returncode}: {stderr}")
+        if response is None:
+            if isinstance(client, MCPHTTPClient):
+                logger.error(f"MCP server at {client.url} closed the connection")
+            else:
+                exit_code = client.exit_code()
+                status = f" (exit code {exit_code})" if exit_code is not None else ""
+                logger.error(f"MCP server exited unexpectedly{status}: {client.stderr_tail()}")
             return {}
         
-        # Handle multi-line JSON responses
-        stdout_lines = stdout.strip().split('\n')
-        response_json = stdout_lines[-1] if stdout_lines else stdout.strip()
-        
-        try:
-            response = json.loads(response_json)
-            
-            # Check for JSON-RPC errors
-            if "error" in response:
-                error = response["error"]
-                error_code = error.get('code', 'unknown')
-                error_message = error.get('message', 'unknown error')
-                
-                # Suppress non-critical errors (like notifications/initialized not found)
-                if error_code == -32601 and "notifications/initialized" in error_message:
-                    logger.debug(f"MCP server: {error_message} (not critical, ignoring)")
-                else:
-                    logger.error(f"MCP server error: {error_code} - {error_message}")
-                    if "data" in error:
-                        logger.debug(f"Error data: {error['data']}")
-                return {}
+        # Check for JSON-RPC errors
+        if "error" in response:
+            error = response["error"]
+            error_code = error.get('code', 'unknown')
+            error_message = error.get('message', 'unknown error')
             
-            result = response.get("result", {})
-            if LOG_LEVEL:
-                logger.debug(f"MCP response: {json.dumps(result)[:200]}...")
-            return result
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing MCP response: {e}")
-            logger.debug(f"Raw response: {stdout}")
-            logger.debug(f"Stderr: {stderr}")
+            # Suppress non-critical errors (like notifications/initialized not found)
+            if error_code == -32601 and "notifications/initialized" in error_message:
+                logger.debug(f"MCP server: {error_message} (not critical, ignoring)")
+            else:
+                logger.error(f"MCP server error: {error_code} - {error_message}")
+                if "data" in error:
+                    logger.debug(f"Error data: {error['data']}")
             return {}
+        
+        result = response.get("result", {})
+        # %.200r truncates the repr instead of serializing the whole result to JSON
+        logger.debug("MCP response: %.200r...", result)
+        return result
             
-    except subprocess.TimeoutExpired:
-        logger.error("MCP server request timed out after 30 seconds")
+    except (subprocess.TimeoutExpired, TimeoutError):
+        logger.error(f"MCP server request timed out after {MCP_REQUEST_TIMEOUT} seconds")
         return {}
     except FileNotFoundError:
         logger.error("Docker not found. Please ensure Docker is installed and available in PATH.")
         return {}
     except Exception as e:
-        logger.error(f"Error communicating with MCP server: {e}", exc_info=LOG_LEVEL)
+        logger.error(f"Error communicating with MCP server: {e}")
+        logger.debug("Traceback:", exc_info=True)
         return {}
 
 
+_mcp_image_ready = False
+
+
+def ensure_mcp_image(image: str = MCP_SERVER_IMAGE) -> bool:
+    """Make sure the MCP server image is available locally, pulling it only if missing.
+    
+    The result is remembered, so the check runs once per script run rather
+    than being repeated implicitly by every container start.
+    """
+    global _mcp_image_ready
+    if _mcp_image_ready:
+        return True
+    
+    try:
+        inspect = subprocess.run(
+            ["docker", "image", "inspect", image],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        if inspect.returncode != 0:
+            logger.info(f"Pulling MCP server image: {image}")
+            subprocess.run(["docker", "pull", image], check=True)
+    except FileNotFoundError:
+        logger.error("Docker not found. Please ensure Docker is installed and available in PATH.")
+        return False
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Failed to pull MCP server image {image} (exit code {e.returncode})")
+        return False
+    
+    _mcp_image_ready = True
+    return True
+
+
 def initialize_mcp() -> bool:
-    """Initialize the MCP server connection."""
+    """Initialize the MCP server connection.
+    
+    This is the first request of a run, so it also makes sure the server image
+    is present and starts the shared container that every later request reuses.
+    """
     logger.info("Initializing MCP server connection...")
+    if not MCP_SERVER_URL and not ensure_mcp_image():
+        return False
+    
     params = {
         "protocolVersion": "2024-11-05",
         "clientInfo": {
@@ -137,10 +595,17 @@ def initialize_mcp() -> bool:
         return False
 
 
+@functools.lru_cache(maxsize=256)
 def get_provider_version(namespace: str, provider: str) -> Optional[str]:
     """Get the latest version of a provider from the Terraform Registry."""
     logger.debug(f"Getting latest version for provider: {namespace}/{provider}")
     
+    cache_key = f"ver:{namespace}/{provider}"
+    cached = _registry_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Using cached version for {namespace}/{provider}: {cached}")
+        return cached
+    
     # MCP tools are called using tools/call method
     params = {
         "name": "get_latest_provider_version",
@@ -160,21 +625,87 @@ def get_provider_version(namespace: str, provider: str) -> Optional[str]:
                     if text:
                         # Version is returned as plain text (e.g., "6.27.0")
                         logger.debug(f"Found version: {text}")
+                        _registry_cache.set(cache_key, text)
                         return text
         # Fallback: check if result has version directly
         version = result.get("version")
         if version:
             logger.debug(f"Found version (direct): {version}")
+            _registry_cache.set(cache_key, version)
             return version
     
     logger.warning(f"Unable to determine latest version for {namespace}/{provider}")
     return None
 
 
+def module_from_fields(fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Build a module entry from the fields of one search_modules result block."""
+    module_id = fields.get("module_id")
+    if not module_id:
+        return None
+    # Parse module_id: namespace/name/provider/version
+    parts = module_id.split('/')
+    if len(parts) < 2:
+        return None
+    
+    module_info = {
+        "name": parts[1],  # e.g., "iam" from "terraform-aws-modules/iam/aws/6.2.3"
+        "source": '/'.join(parts[:2]),  # e.g., "terraform-aws-modules/iam"
+        "module_id": module_id
+    }
+    display_name = fields.get("Name")
+    if display_name and display_name != "name":  # Skip header
+        module_info["display_name"] = display_name
+    if "Description" in fields:
+        module_info["description"] = fields["Description"]
+    return module_info
+
+
+def parse_module_search_text(text: str) -> List[Dict[str, Any]]:
+    """Parse the text returned by the search_modules tool in a single line scan.
+    
+    Results are blocks of "Key: value" lines separated by "---" lines; the
+    header block (which describes the fields) is skipped.
+    """
+    modules = []
+    fields: Dict[str, str] = {}
+    in_header = False
+    # A trailing separator flushes the last block
+    for line in chain(text.splitlines(), ("---",)):
+        if line.strip() == "---":
+            if not in_header:
+                module_info = module_from_fields(fields)
+                if module_info:
+                    modules.append(module_info)
+            fields = {}
+            in_header = False
+            continue
+        
+        if "Available Terraform Modules" in line or "Each result includes" in line:
+            in_header = True
+        
+        # Fields may be bare ("Name: x") or list items ("- Name: x")
+        key, separator, value = line.partition(':')
+        key = key.strip(" \t-*")
+        value = value.strip()
+        if separator and value and key in MODULE_FIELDS:
+            # First occurrence wins, as with a search for the field
+            fields.setdefault(key, value)
+    
+    return modules
+
+
+@functools.lru_cache(maxsize=256)
 def search_modules(provider: str, limit: int = 5) -> List[Dict[str, Any]]:
     """Search for modules related to a provider."""
     logger.debug(f"Searching for modules related to: {provider}")
     
+    cache_key = f"mods:{provider}:{limit}"
+    cached = _registry_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Using {len(cached)} cached modules for {provider}")
+        return cached
+    
     # MCP tools are called using tools/call method
     params = {
         "name": "search_modules",
@@ -191,60 +722,35 @@ def search_modules(provider: str, limit: int = 5) -> List[Dict[str, Any]]:
             for content_item in result["content"]:
                 if content_item.get("type") == "text":
                     text = content_item.get("text", "")
-                    # Parse text format: module_id: namespace/name/provider/version
-                    modules = []
-                    # Extract module blocks (between --- markers)
-                    module_blocks = re.split(r'---\s*\n', text)
-                    for block in module_blocks:
-                        # Skip header block (contains "Available Terraform Modules")
-                        if "Available Terraform Modules" in block or "Each result includes" in block:
-                            continue
-                        
-                        # Extract module_id
-                        module_id_match = re.search(r'module_id:\s*([^\n]+)', block)
-                        if module_id_match:
-                            module_id = module_id_match.group(1).strip()
-                            # Parse module_id: namespace/name/provider/version
-                            parts = module_id.split('/')
-                            if len(parts) >= 2:
-                                module_name = parts[1]  # e.g., "iam" from "terraform-aws-modules/iam/aws/6.2.3"
-                                module_source = '/'.join(parts[:2])  # e.g., "terraform-aws-modules/iam"
-                                
-                                # Extract name and description
-                                name_match = re.search(r'Name:\s*([^\n]+)', block)
-                                desc_match = re.search(r'Description:\s*([^\n]+)', block)
-                                
-                                module_info = {
-                                    "name": module_name,
-                                    "source": module_source,
-                                    "module_id": module_id
-                                }
-                                if name_match:
-                                    display_name = name_match.group(1).strip()
-                                    if display_name and display_name != "name":  # Skip header
-                                        module_info["display_name"] = display_name
-                                if desc_match:
-                                    module_info["description"] = desc_match.group(1).strip()
-                                
-                                modules.append(module_info)
+                    modules = parse_module_search_text(text)
                     
                     if modules:
                         logger.debug(f"Found {len(modules)} modules")
+                        _registry_cache.set(cache_key, modules)
                         return modules
         # Fallback: check if result has modules directly
         if "modules" in result:
             modules = result.get("modules", [])
             logger.debug(f"Found {len(modules)} modules (direct)")
+            if modules:
+                _registry_cache.set(cache_key, modules)
             return modules
     
     logger.warning(f"No modules found for provider: {provider}")
     return []
 
 
+@functools.lru_cache(maxsize=256)
 def get_resource_docs(namespace: str, provider: str, resource: str) -> Optional[Dict[str, Any]]:
     """Get documentation for a specific resource."""
     logger.debug(f"Getting docs for resource: {namespace}/{provider}/{resource}")
     
+    cache_key = f"docs:{namespace}/{provider}/{resource}"
+    cached = _registry_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Using cached docs for {namespace}/{provider}/{resource}")
+        return cached
+    
     # MCP tools are called using tools/call method
     params = {
         "name": "get_resource_docs",
@@ -256,21 +762,25 @@ def get_resource_docs(namespace: str, provider: str, resource: str) -> Optional[
     }
     
     result = send_mcp_request("tools/call", params)
-    if result:
-        # MCP tool results are typically in a "content" array with text items
-        if "content" in result:
-            for content_item in result["content"]:
-                if content_item.get("type") == "text":
-                    text = content_item.get("text", "")
-                    try:
-                        return json.loads(text)
-                    except json.JSONDecodeError:
-                        return {"text": text}
-        return result
+    if not result:
+        return None
     
-    return None
+    docs = result
+    # MCP tool results are typically in a "content" array with text items
+    for content_item in result.get("content", []):
+        if content_item.get("type") == "text":
+            text = content_item.get("text", "")
+            try:
+                docs = json_loads(text)
+            except json.JSONDecodeError:
+                docs = {"text": text}
+            break
+    
+    _registry_cache.set(cache_key, docs)
+    return docs
 
 
+@functools.lru_cache(maxsize=256)
 def normalize_provider_name(name: str) -> str:
     """Normalize a provider name to its base form.
     
@@ -280,73 +790,123 @@ def normalize_provider_name(name: str) -> str:
     - "aws_api_gateway" -> "aws" (extract base provider from resource type-like names)
     """
     # Remove region/alias suffixes (e.g., "aws.us-east-1" -> "aws")
-    base_name = name.split('.')[0] if '.' in name else name
+    base_name = name.partition('.')[0]
     
     # If it looks like a resource type (has underscores), extract the first part
     # This handles cases where resource types might be incorrectly used as provider names
-    if '_' in base_name:
-        parts = base_name.split('_')
-        # Only use the first part if it's a valid provider name (2-10 chars, lowercase)
-        if len(parts[0]) >= 2 and len(parts[0]) <= 10 and parts[0].islower():
-            return parts[0]
+    prefix, sep, _ = base_name.partition('_')
+    # Only use the first part if it's a valid provider name (2-10 chars, lowercase)
+    if sep and 2 <= len(prefix) <= 10 and prefix.islower():
+        return prefix
     
     return base_name
 
 
+def find_required_providers_blocks(content: bytes) -> Iterator[bytes]:
+    """Yield the body of each required_providers block, matching nested braces."""
+    for match in REQUIRED_PROVIDERS_RE.finditer(content):
+        depth = 1
+        for token in HCL_BRACE_TOKEN_RE.finditer(content, match.end()):
+            if token.group() == b'{':
+                depth += 1
+            elif token.group() == b'}':
+                depth -= 1
+                if depth == 0:
+                    yield content[match.end():token.start()]
+                    break
+
+
+def parse_required_providers(content: bytes) -> List[Tuple[str, str]]:
+    """Return (local name, source) pairs declared in a .tf file's required_providers blocks.
+    
+    Uses python-hcl2 when installed and falls back to scanning the blocks
+    with regular expressions when it is not, or when the file does not parse.
+    """
+    if hcl2 is not None:
+        try:
+            parsed = hcl2.loads(content.decode('utf-8'))
+        except Exception as e:
+            logger.debug(f"hcl2 could not parse file, scanning it instead: {e}")
+        else:
+            pairs = []
+            for terraform_block in parsed.get("terraform", []):
+                for required_providers in terraform_block.get("required_providers", []):
+                    for provider_name, spec in required_providers.items():
+                        # Newer python-hcl2 releases keep string quotes and add "__is_block__" markers
+                        if isinstance(spec, dict) and "source" in spec:
+                            pairs.append((provider_name, str(spec["source"]).strip('"')))
+            return pairs
+    
+    return [
+        (raw_name.decode('utf-8', 'replace'), raw_source.decode('utf-8', 'replace'))
+        for block in find_required_providers_blocks(content)
+        for raw_name, raw_source in PROVIDER_SOURCE_RE.findall(block)
+    ]
+
+
+def iter_tf_files(directory: Union[str, Path]) -> Iterator[os.DirEntry]:
+    """Yield the .tf files under ``directory``, including nested modules.
+    
+    Each directory's own files come before its subdirectories, so the root
+    module wins when providers are deduplicated. Hidden directories such as
+    .terraform (the provider/module cache) and .git are skipped, as are
+    directories that cannot be read.
+    """
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.name.endswith(".tf") and entry.is_file():
+                    yield entry
+    except OSError as e:
+        # e.g. a root-owned directory left by a container bind mount
+        logger.warning(f"Skipping unreadable directory {directory}: {e}")
+    
+    for subdirectory in subdirectories:
+        yield from iter_tf_files(subdirectory)
+
+
 def extract_providers_from_terraform_files(terraform_dir: str = "terraform") -> List[Dict[str, str]]:
     """Extract providers from Terraform files by parsing required_providers blocks."""
     providers = []
     provider_sources = {}
     
     terraform_path = Path(terraform_dir)
-    if not terraform_path.exists():
+    if not terraform_path.is_dir():
         logger.warning(f"Terraform directory not found: {terraform_dir}")
         return providers
     
-    # Pattern to match required_providers blocks
-    # Matches: provider_name = { source = "namespace/provider", version = "..." }
-    provider_pattern = re.compile(
-        r'(\w+)\s*=\s*\{[^}]*source\s*=\s*["\']([^"\']+)["\']',
-        re.MULTILINE | re.DOTALL
-    )
-    
-    for tf_file in terraform_path.glob("*.tf"):
+    for tf_file in iter_tf_files(terraform_path):
         try:
-            with open(tf_file, 'r', encoding='utf-8') as f:
+            # Read raw bytes so files without required_providers are skipped undecoded
+            with open(tf_file.path, 'rb') as f:
                 content = f.read()
-                
+            
             # Look for required_providers block
-            if 'required_providers' in content:
-                # Extract the required_providers block
-                required_providers_match = re.search(
-                    r'required_providers\s*\{([^}]+)\}',
-                    content,
-                    re.MULTILINE | re.DOTALL
-                )
-                
-                if required_providers_match:
-                    providers_block = required_providers_match.group(1)
-                    matches = provider_pattern.findall(providers_block)
-                    
-                    for provider_name, source in matches:
-                        if provider_name not in provider_sources:
-                            # Parse source: "hashicorp/aws" -> namespace="hashicorp", name="aws"
-                            source_parts = source.split('/')
-                            if len(source_parts) == 2:
-                                namespace = source_parts[0]
-                                name = source_parts[1]
-                            else:
-                                # Fallback: assume hashicorp namespace
-                                namespace = "hashicorp"
-                                name = provider_name
-                            
-                            provider_sources[provider_name] = {
-                                "namespace": namespace,
-                                "name": name
-                            }
-                            logger.debug(f"Found provider in {tf_file.name}: {namespace}/{name}")
+            if b'required_providers' in content:
+                for provider_name, source in parse_required_providers(content):
+                    if provider_name not in provider_sources:
+                        # Parse source: "hashicorp/aws" -> namespace="hashicorp", name="aws"
+                        source_parts = source.split('/')
+                        if len(source_parts) == 2:
+                            namespace = source_parts[0]
+                            name = source_parts[1]
+                        else:
+                            # Fallback: assume hashicorp namespace
+                            namespace = "hashicorp"
+                            name = provider_name
+                        
+                        provider_sources[provider_name] = {
+                            "namespace": namespace,
+                            "name": name
+                        }
+                        logger.debug(f"Found provider in {tf_file.name}: {namespace}/{name}")
         except Exception as e:
-            logger.warning(f"Error parsing {tf_file}: {e}")
+            logger.warning(f"Error parsing {tf_file.path}: {e}")
     
     providers = list(provider_sources.values())
     if providers:
@@ -355,62 +915,94 @@ def extract_providers_from_terraform_files(terraform_dir: str = "terraform") ->
     return providers
 
 
+def load_lockfile(terraform_dir: str = "terraform") -> Dict[str, str]:
+    """Return the provider versions locked in .terraform.lock.hcl, keyed by "namespace/name"."""
+    lockfile_path = Path(terraform_dir) / ".terraform.lock.hcl"
+    try:
+        with open(lockfile_path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logger.debug(f"Could not read {lockfile_path}: {e}")
+        return {}
+    
+    locked_versions = {
+        f"{namespace.decode().lower()}/{name.decode().lower()}": version.decode()
+        for namespace, name, version in LOCKFILE_PROVIDER_RE.findall(content)
+    }
+    if locked_versions:
+        logger.info(f"Found {len(locked_versions)} locked provider version(s) in {lockfile_path}")
+    return locked_versions
+
+
 def extract_providers_from_resource_types(plan: Dict[str, Any]) -> List[Dict[str, str]]:
     """Extract provider names from resource types in the plan.
     
     This function extracts the base provider name from resource types.
     For example: "aws_s3_bucket" -> "aws", "aws_api_gateway_rest_api" -> "aws"
     """
-    providers = set()
-    provider_list = []
+    seen: Dict[str, Dict[str, str]] = {}
     
     resource_changes = plan.get("resource_changes", [])
     planned_values = plan.get("planned_values", {})
     root_module = planned_values.get("root_module", {})
     
-    # Extract from resource_changes
-    for change in resource_changes:
-        resource_type = change.get("type", "")
-        if resource_type:
-            # Extract provider prefix: "aws_s3_bucket" -> "aws"
-            # Only match the first word before underscore to get base provider name
-            provider_match = re.match(r'^([a-z][a-z0-9]*)_', resource_type)
-            if provider_match:
-                provider_name = normalize_provider_name(provider_match.group(1))
-                if provider_name not in providers:
-                    providers.add(provider_name)
-                    # Default to hashicorp namespace
-                    provider_list.append({
-                        "namespace": "hashicorp",
-                        "name": provider_name
-                    })
-                    logger.debug(f"Extracted provider '{provider_name}' from resource type '{resource_type}'")
-    
-    # Extract from planned_values.root_module.resources
-    for resource in root_module.get("resources", []):
-        resource_type = resource.get("type", "")
-        if resource_type:
-            # Extract provider prefix: "aws_s3_bucket" -> "aws"
-            # Only match the first word before underscore to get base provider name
-            provider_match = re.match(r'^([a-z][a-z0-9]*)_', resource_type)
-            if provider_match:
-                provider_name = provider_match.group(1)
-                if provider_name not in providers:
-                    providers.add(provider_name)
-                    provider_list.append({
-                        "namespace": "hashicorp",
-                        "name": provider_name
-                    })
-                    logger.debug(f"Extracted provider '{provider_name}' from resource type '{resource_type}'")
-    
-    if provider_list:
-        unique_providers = {p['name'] for p in provider_list}
-        logger.info(f"Extracted {len(unique_providers)} unique provider(s) from resource types: {', '.join(sorted(unique_providers))}")
-    
-    return provider_list
-
-
-def validate_plan_structure(plan: Dict[str, Any], plan_path: str) -> Tuple[bool, Optional[str]]:
+    # Distinct types from resource_changes and planned_values.root_module.resources,
+    # in first-seen order, so each type is only inspected once
+    resource_types = dict.fromkeys(
+        resource.get("type", "")
+        for resource in chain(resource_changes, root_module.get("resources", []))
+    )
+    
+    for resource_type in resource_types:
+        # Extract provider prefix: "aws_s3_bucket" -> "aws"
+        # Only the first word before an underscore, lowercase ASCII starting with a letter
+        prefix, separator, _ = resource_type.partition('_')
+        if separator and prefix[:1].isalpha() and prefix.isascii() and prefix.isalnum() and prefix.islower():
+            provider_name = normalize_provider_name(prefix)
+            if provider_name not in seen:
+                # Default to hashicorp namespace
+                seen[provider_name] = {
+                    "namespace": "hashicorp",
+                    "name": provider_name
+                }
+                logger.debug(f"Extracted provider '{provider_name}' from resource type '{resource_type}'")
+    
+    if seen:
+        logger.info(f"Extracted {len(seen)} unique provider(s) from resource types: {', '.join(sorted(seen))}")
+    
+    return list(seen.values())
+
+
+def load_plan(plan_path: str) -> Optional[Dict[str, Any]]:
+    """Read and parse the Terraform plan JSON.
+    
+    Returns None if the file cannot be read or is not a JSON object, so the
+    caller falls back to the Terraform files. FileNotFoundError is left to
+    the caller, which treats a missing plan as fatal.
+    """
+    try:
+        with open(plan_path, 'rb') as f:
+            content = f.read()
+        # A failed `terraform plan` leaves a "{}" stub (see generate-terraform-plan.sh);
+        # recognise it without going through the parser
+        if len(content) < 16 and content.strip() == b'{}':
+            return {}
+        plan = json_loads(content)
+        if isinstance(plan, dict):
+            return plan
+        logger.error(f"Error parsing plan file: expected a JSON object, got {type(plan).__name__}")
+    except FileNotFoundError:
+        raise
+    except OSError as e:
+        logger.error(f"Error reading plan file: {e}")
+    except ValueError as e:  # JSONDecodeError, or UnicodeDecodeError without orjson
+        logger.error(f"Error parsing plan file: {e}")
+    return None
+
+
+def validate_plan_structure(plan: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
     """Validate that the plan JSON has a proper structure."""
     # Check if plan is empty
     if not plan or plan == {}:
@@ -428,180 +1020,166 @@ def validate_plan_structure(plan: Dict[str, Any], plan_path: str) -> Tuple[bool,
     return True, None
 
 
-def extract_providers_from_plan(plan_path: str, terraform_dir: str = "terraform") -> List[Dict[str, str]]:
-    """Extract unique providers from a Terraform plan JSON file with multiple fallbacks."""
-    providers = set()
-    provider_list = []
+def extract_providers_from_provider_configs(plan: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Extract providers from the plan's configuration.provider_configs section."""
+    providers = []
+    provider_configs = plan.get("configuration", {}).get("provider_configs", {})
     
-    try:
-        # Check if plan file exists
-        if not os.path.exists(plan_path):
-            logger.warning(f"Plan file not found: {plan_path}")
-            # Fallback to extracting from Terraform files
-            return extract_providers_from_terraform_files(terraform_dir)
+    if provider_configs:
+        logger.debug("Extracting providers from configuration.provider_configs")
+    for provider_key, provider_data in provider_configs.items():
+        # Normalize provider key - remove region/alias suffixes (e.g., "aws.us-east-1" -> "aws")
+        # Provider keys in Terraform can be like "aws", "aws.us-east-1", etc.
+        base_provider_key = normalize_provider_name(provider_key)
         
-        # Read and parse plan JSON
-        with open(plan_path, 'r') as f:
-            plan = json.load(f)
+        # Try to get namespace from provider config if available
+        namespace = "hashicorp"  # Default
+        name = base_provider_key
         
-        # Validate plan structure
-        is_valid, error_msg = validate_plan_structure(plan, plan_path)
-        if not is_valid:
-            logger.warning(f"Plan validation failed: {error_msg}")
-            logger.info("This is expected if terraform plan failed (e.g., missing AWS credentials).")
-            logger.info("Attempting to extract providers from Terraform files as fallback...")
-            return extract_providers_from_terraform_files(terraform_dir)
+        # Check if provider_data has source information
+        if isinstance(provider_data, dict):
+            # Some plans may have full_provider_name or source
+            full_name = provider_data.get("full_provider_name", "")
+            if full_name and '/' in full_name:
+                namespace, name = full_name.split('/', 1)
+                # Normalize name to base provider
+                name = normalize_provider_name(name)
+            # Also check for name field in provider_data
+            elif "name" in provider_data:
+                name = normalize_provider_name(provider_data.get("name", base_provider_key))
         
+        providers.append({"namespace": namespace, "name": name})
+    
+    return providers
+
+
+def merge_providers(found: Dict[str, Dict[str, str]], providers: List[Dict[str, str]], origin: str) -> None:
+    """Add providers to ``found`` (keyed by "namespace/name"), keeping the first occurrence."""
+    for provider in providers:
+        provider_key = f"{provider['namespace']}/{provider['name']}"
+        if provider_key not in found:
+            found[provider_key] = provider
+            logger.debug(f"Found provider in {origin}: {provider_key}")
+
+
+def extract_providers_from_plan(plan: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Extract unique providers from a parsed, structurally valid Terraform plan."""
+    # Keyed by "namespace/name"; dicts keep insertion order, so this both
+    # deduplicates and preserves discovery order
+    found_providers: Dict[str, Dict[str, str]] = {}
+    
+    try:
         # Method 1: Extract from configuration.provider_configs (primary method)
-        config = plan.get("configuration", {})
-        provider_configs = config.get("provider_configs", {})
-        
-        if provider_configs:
-            logger.debug("Extracting providers from configuration.provider_configs")
-            for provider_key, provider_data in provider_configs.items():
-                # Normalize provider key - remove region/alias suffixes (e.g., "aws.us-east-1" -> "aws")
-                # Provider keys in Terraform can be like "aws", "aws.us-east-1", etc.
-                base_provider_key = normalize_provider_name(provider_key)
-                
-                # Try to get namespace from provider config if available
-                namespace = "hashicorp"  # Default
-                name = base_provider_key
-                
-                # Check if provider_data has source information
-                if isinstance(provider_data, dict):
-                    # Some plans may have full_provider_name or source
-                    full_name = provider_data.get("full_provider_name", "")
-                    if full_name and '/' in full_name:
-                        namespace, name = full_name.split('/', 1)
-                        # Normalize name to base provider
-                        name = normalize_provider_name(name)
-                    # Also check for name field in provider_data
-                    elif "name" in provider_data:
-                        name = normalize_provider_name(provider_data.get("name", base_provider_key))
-                
-                provider_key_full = f"{namespace}/{name}"
-                if provider_key_full not in providers:
-                    providers.add(provider_key_full)
-                    provider_list.append({
-                        "namespace": namespace,
-                        "name": name
-                    })
-                    logger.debug(f"Found provider in plan: {namespace}/{name}")
+        merge_providers(found_providers, extract_providers_from_provider_configs(plan), "plan")
         
         # Method 2: Extract from resource types (always run to ensure we have all providers)
         # This should only extract the base provider name (e.g., "aws" from "aws_s3_bucket")
         # We merge results with Method 1 to ensure completeness
         logger.debug("Extracting providers from resource types as additional validation...")
-        resource_providers = extract_providers_from_resource_types(plan)
-        for provider in resource_providers:
-            provider_key = f"{provider['namespace']}/{provider['name']}"
-            if provider_key not in providers:
-                providers.add(provider_key)
-                provider_list.append(provider)
-                logger.debug(f"Added provider from resource types: {provider_key}")
-        
-        # Method 3: Fallback to Terraform files if still no providers
-        if not provider_list:
-            logger.info("No providers found in plan, extracting from Terraform files...")
-            file_providers = extract_providers_from_terraform_files(terraform_dir)
-            for provider in file_providers:
-                provider_key = f"{provider['namespace']}/{provider['name']}"
-                if provider_key not in providers:
-                    providers.add(provider_key)
-                    provider_list.append(provider)
+        merge_providers(found_providers, extract_providers_from_resource_types(plan), "resource types")
         
-        # Final deduplication and normalization pass
-        final_providers = {}
-        for provider in provider_list:
-            # Normalize the provider name one more time to be safe
-            normalized_name = normalize_provider_name(provider["name"])
-            provider_key = f"{provider['namespace']}/{normalized_name}"
-            
-            if provider_key not in final_providers:
-                final_providers[provider_key] = {
-                    "namespace": provider["namespace"],
-                    "name": normalized_name
-                }
-        
-        final_list = list(final_providers.values())
+        # Names are normalized as they are inserted, so the dict is already final
+        final_list = list(found_providers.values())
         
         if final_list:
             unique_names = [p['name'] for p in final_list]
             logger.info(f"Successfully extracted {len(final_list)} unique provider(s) from plan: {', '.join(sorted(unique_names))}")
         else:
-            logger.warning("No providers found using any extraction method")
+            logger.info("No providers found in plan")
         
         return final_list
         
-    except FileNotFoundError:
-        logger.warning(f"Plan file not found: {plan_path}")
-        return extract_providers_from_terraform_files(terraform_dir)
-    except json.JSONDecodeError as e:
-        logger.error(f"Error parsing plan file: {e}")
-        logger.info("Attempting to extract providers from Terraform files as fallback...")
-        return extract_providers_from_terraform_files(terraform_dir)
     except Exception as e:
-        logger.error(f"Error extracting providers: {e}", exc_info=LOG_LEVEL)
-        return extract_providers_from_terraform_files(terraform_dir)
+        logger.error(f"Error extracting providers: {e}")
+        logger.debug("Traceback:", exc_info=True)
+        return []
 
 
-def analyze_plan_resources(plan_path: str) -> Dict[str, Any]:
-    """Analyze resources in the Terraform plan."""
+@dataclass(slots=True)
+class ResourceChange:
+    """A single entry from the plan's resource_changes, reduced to what the report uses."""
+    type: str
+    name: str
+    actions: List[str]
+
+
+def analyze_plan_resources(plan: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Analyze resources in a parsed Terraform plan (None is treated as empty)."""
     try:
-        with open(plan_path, 'r') as f:
-            plan = json.load(f)
-        
-        resource_changes = plan.get("resource_changes", [])
-        
-        actions = {
-            "create": 0,
-            "update": 0,
-            "delete": 0,
-            "replace": 0
-        }
-        
-        resources = []
-        resource_types = set()
+        resource_changes = (plan or {}).get("resource_changes", [])
         
+        # One pass builds the resources, their per-type counts and the
+        # per-action grouping used by the report and best-practice checks
+        resources: List[ResourceChange] = []
+        type_counts: Counter = Counter()
+        by_action: Dict[str, List[ResourceChange]] = defaultdict(list)
         for change in resource_changes:
-            actions_list = change.get("change", {}).get("actions", [])
-            for action in actions_list:
-                if action in actions:
-                    actions[action] += 1
-            
-            resource_type = change.get("type", "unknown")
-            resource_name = change.get("name", "unknown")
-            resource_types.add(resource_type)
-            
-            resources.append({
-                "type": resource_type,
-                "name": resource_name,
-                "actions": actions_list
-            })
+            resource = ResourceChange(
+                change.get("type", "unknown"),
+                change.get("name", "unknown"),
+                change.get("change", {}).get("actions", [])
+            )
+            resources.append(resource)
+            type_counts[resource.type] += 1
+            # Only the reported actions are kept, skipping no-op/read entries
+            for action in resource.actions:
+                if action in PLAN_ACTION_SET:
+                    by_action[action].append(resource)
         
         return {
-            "actions": actions,
+            "actions": {action: len(by_action[action]) for action in PLAN_ACTIONS},
+            "by_action": by_action,
             "resources": resources,
             "total_resources": len(resources),
-            "resource_types": sorted(list(resource_types))
+            "resource_types": sorted(type_counts),
+            "type_counts": type_counts
         }
         
     except Exception as e:
-        logger.error(f"Error analyzing plan: {e}", exc_info=LOG_LEVEL)
+        logger.error(f"Error analyzing plan: {e}")
+        logger.debug("Traceback:", exc_info=True)
         return {
-            "actions": {},
+            "actions": dict.fromkeys(PLAN_ACTIONS, 0),
+            "by_action": {},
             "resources": [],
             "total_resources": 0,
-            "resource_types": []
+            "resource_types": [],
+            "type_counts": Counter()
         }
 
 
+def analyze_plan(plan: Optional[Dict[str, Any]], terraform_dir: str = "terraform") -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """Return the providers and resource analysis for a plan that was parsed once.
+    
+    The plan is validated here, once. When it is missing (None), malformed or
+    yields no providers, they are read from the Terraform files instead.
+    """
+    logger.info("Extracting providers from Terraform plan...")
+    providers: List[Dict[str, str]] = []
+    if plan is not None:
+        is_valid, error_msg = validate_plan_structure(plan)
+        if is_valid:
+            providers = extract_providers_from_plan(plan)
+        else:
+            logger.warning(f"Plan validation failed: {error_msg}")
+            logger.info("This is expected if terraform plan failed (e.g., missing AWS credentials).")
+    
+    if not providers:
+        logger.info("Attempting to extract providers from Terraform files as fallback...")
+        providers = extract_providers_from_terraform_files(terraform_dir)
+    
+    logger.info("Analyzing Terraform plan...")
+    plan_analysis = analyze_plan_resources(plan)
+    
+    return providers, plan_analysis
+
+
 def validate_resource_configuration(namespace: str, provider: str, resource_type: str) -> Optional[Dict[str, Any]]:
     """Validate a resource type configuration using MCP server."""
     logger.debug(f"Validating resource type: {resource_type}")
     
     # Extract provider from resource type (e.g., "aws_s3_bucket" -> "aws")
-    provider_match = re.match(r'^(\w+)_', resource_type)
+    provider_match = RESOURCE_PREFIX_RE.match(resource_type)
     if not provider_match:
         return None
     
@@ -622,80 +1200,289 @@ def validate_resource_configuration(namespace: str, provider: str, resource_type
     }
 
 
-def analyze_resource_best_practices(resources: List[Dict[str, Any]], providers: List[Dict[str, str]]) -> List[str]:
-    """Analyze resources for common best practices and issues."""
+def analyze_resource_best_practices(type_counts: Dict[str, int], providers: List[Dict[str, str]]) -> List[str]:
+    """Analyze resources for common best practices and issues, given per-type resource counts."""
     recommendations = []
     
-    # Group resources by type
-    resource_by_type = {}
-    for resource in resources:
-        resource_type = resource.get("type", "unknown")
-        if resource_type not in resource_by_type:
-            resource_by_type[resource_type] = []
-        resource_by_type[resource_type].append(resource)
-    
     # Check for common AWS resource patterns
     aws_provider = next((p for p in providers if p.get("name") == "aws"), None)
     if aws_provider:
         # Check for S3 buckets without versioning
-        if "aws_s3_bucket" in resource_by_type:
-            s3_resources = resource_by_type["aws_s3_bucket"]
-            recommendations.append(f"Found {len(s3_resources)} S3 bucket(s) - ensure versioning and encryption are configured")
+        if "aws_s3_bucket" in type_counts:
+            recommendations.append(f"Found {type_counts['aws_s3_bucket']} S3 bucket(s) - ensure versioning and encryption are configured")
         
         # Check for Lambda functions
-        if "aws_lambda_function" in resource_by_type:
-            lambda_resources = resource_by_type["aws_lambda_function"]
-            recommendations.append(f"Found {len(lambda_resources)} Lambda function(s) - review timeout and memory settings")
+        if "aws_lambda_function" in type_counts:
+            recommendations.append(f"Found {type_counts['aws_lambda_function']} Lambda function(s) - review timeout and memory settings")
         
         # Check for DynamoDB tables
-        if "aws_dynamodb_table" in resource_by_type:
-            dynamodb_resources = resource_by_type["aws_dynamodb_table"]
-            recommendations.append(f"Found {len(dynamodb_resources)} DynamoDB table(s) - verify backup and encryption settings")
+        if "aws_dynamodb_table" in type_counts:
+            recommendations.append(f"Found {type_counts['aws_dynamodb_table']} DynamoDB table(s) - verify backup and encryption settings")
         
         # Check for IAM roles
-        if "aws_iam_role" in resource_by_type:
-            iam_resources = resource_by_type["aws_iam_role"]
-            recommendations.append(f"Found {len(iam_resources)} IAM role(s) - ensure least-privilege policies are applied")
+        if "aws_iam_role" in type_counts:
+            recommendations.append(f"Found {type_counts['aws_iam_role']} IAM role(s) - ensure least-privilege policies are applied")
     
     return recommendations
 
 
 def check_plan_generation_status(plan_path: str, plan_output_path: str = "terraform/plan_output.txt") -> Tuple[bool, Optional[str]]:
     """Check if terraform plan was successful by examining output file."""
-    if not os.path.exists(plan_output_path):
-        return True, None  # Can't determine, assume OK
-    
     try:
-        with open(plan_output_path, 'r') as f:
+        with open(plan_output_path, 'rb') as f:
             output = f.read()
         
-        # Check for common error indicators
-        error_patterns = [
-            r'Error:',
-            r'Error configuring',
-            r'Failed to',
-            r'authentication',
-            r'credentials',
-            r'AccessDenied'
-        ]
+        # A clean plan contains none of the error tokens, which plain substring
+        # searches rule out faster than the case-insensitive regex
+        lowered = output.lower()
+        if not any(token in lowered for token in PLAN_ERROR_TOKENS):
+            return True, None
         
-        for pattern in error_patterns:
-            if re.search(pattern, output, re.IGNORECASE):
-                return False, f"Terraform plan appears to have failed. Check {plan_output_path} for details."
+        # Check for common error indicators in a single pass
+        if PLAN_ERROR_RE.search(output):
+            return False, f"Terraform plan appears to have failed. Check {plan_output_path} for details."
         
         return True, None
+    except FileNotFoundError:
+        return True, None  # Can't determine, assume OK
     except Exception as e:
         logger.debug(f"Could not read plan output file: {e}")
         return True, None  # Can't determine, assume OK
 
 
+# Static report and AI-analysis text, built once at import rather than per run
+REPORT_HEADER = "# Terraform MCP Validation Report\n## Plan Summary\n"
+PROVIDER_SECTION_HEADER = "## Provider Validation\n"
+NO_PROVIDERS_NOTE = (
+    "⚠️ **Note**: No providers found in plan.\n\n"
+    "This usually indicates that `terraform plan` failed (e.g., missing AWS credentials).\n"
+    "Provider validation was attempted using fallback methods but no providers were found.\n\n"
+)
+AI_RECOMMENDATIONS = """
+### Recommendations:
+1. Review provider versions to ensure you're using the latest stable versions
+2. Consider using recommended modules from the Terraform Registry
+3. Verify all resource configurations match the latest provider documentation
+4. Review resource changes carefully before applying
+"""
+AI_ANALYSIS_EMPTY_PLAN = """## Terraform Plan Analysis
+
+This plan includes:
+- No resource changes (plan may be empty or failed)
+- Provider validation completed via HashiCorp MCP Server
+
+### Recommendations:
+1. Review provider versions to ensure you're using the latest stable versions
+2. Consider using recommended modules from the Terraform Registry
+3. Verify all resource configurations match the latest provider documentation
+
+*Note: If the plan is empty, this may indicate missing AWS credentials. Configure AWS OIDC authentication to enable full plan generation.*
+"""
+
+
+def lookup_providers(providers: List[Dict[str, str]], locked_versions: Optional[Dict[str, str]] = None) -> List[Tuple[Dict[str, str], Optional[str], Optional[str], List[Dict[str, Any]]]]:
+    """Fetch the latest version and recommended modules for each provider, in order.
+    
+    Each result also carries the provider's version from ``locked_versions``
+    (None if it is not locked). With MCP_LOCKED_VERSIONS_ONLY set, locked
+    providers skip the latest-version lookup and report None for it.
+    """
+    locked_versions = locked_versions or {}
+    # Look up every provider concurrently over the shared MCP connection
+    with ThreadPoolExecutor(max_workers=MCP_MAX_WORKERS) as executor:
+        lookups = []
+        futures = []
+        for provider in providers:
+            logger.info(f"Validating provider: {provider['namespace']}/{provider['name']}")
+            locked_version = locked_versions.get(f"{provider['namespace']}/{provider['name']}")
+            if locked_version is not None and MCP_LOCKED_VERSIONS_ONLY:
+                version_future = None
+            else:
+                version_future = executor.submit(get_provider_version, provider["namespace"], provider["name"])
+                futures.append(version_future)
+            modules_future = executor.submit(search_modules, provider["name"], limit=3)
+            futures.append(modules_future)
+            lookups.append((provider, version_future, locked_version, modules_future))
+        
+        for done, _ in enumerate(as_completed(futures), 1):
+            logger.debug(f"Completed {done}/{len(futures)} provider lookups")
+    
+    return [
+        (
+            provider,
+            version_future.result() if version_future is not None else None,
+            locked_version,
+            modules_future.result()
+        )
+        for provider, version_future, locked_version, modules_future in lookups
+    ]
+
+
+def render_plan_summary(plan_analysis: Dict[str, Any]) -> str:
+    """Render the report header, plan summary and resource type list."""
+    n_create, n_update, n_delete, n_replace = get_action_counts(plan_analysis['actions'])
+    summary = REPORT_HEADER + (
+        f"- Total Resources: {plan_analysis['total_resources']}\n"
+        "- Actions:\n"
+        f"  - Create: {n_create}\n"
+        f"  - Update: {n_update}\n"
+        f"  - Delete: {n_delete}\n"
+        f"  - Replace: {n_replace}\n"
+    )
+    
+    # Add resource types if plan has resources
+    resource_types = plan_analysis.get('resource_types')
+    if plan_analysis['total_resources'] > 0 and resource_types:
+        type_count = len(resource_types)
+        type_lines = "".join([f"  - `{resource_type}`\n" for resource_type in resource_types[:10]])  # Limit to first 10
+        more = f"  - ... and {type_count - 10} more\n" if type_count > 10 else ""
+        summary += (
+            "\n### Resource Types in Plan\n"
+            f"- {type_count} unique resource type(s):\n"
+            f"{type_lines}{more}\n"
+        )
+    
+    return summary
+
+
+def render_module(module: Dict[str, Any]) -> str:
+    """Render one recommended module as a report bullet."""
+    # Prefer display_name if available, otherwise use name
+    module_name = module.get("display_name") or module.get("name", "unknown")
+    module_source = module.get("source", "")
+    if module_source:
+        return f"  - `{module_name}` ({module_source})\n"
+    return f"  - `{module_name}`\n"
+
+
+def render_provider_validation(results: List[Tuple[Dict[str, str], Optional[str], Optional[str], List[Dict[str, Any]]]]) -> Iterator[str]:
+    """Yield the provider validation section from lookup_providers() results, one provider at a time."""
+    yield PROVIDER_SECTION_HEADER
+    if not results:
+        yield NO_PROVIDERS_NOTE
+        return
+    
+    for provider, version, locked_version, modules in results:
+        if version:
+            version_line = f"- Latest Version: `{version}`\n"
+        elif locked_version and MCP_LOCKED_VERSIONS_ONLY:
+            version_line = ""  # Not looked up
+        else:
+            version_line = "- Latest Version: ⚠️ Unable to determine\n"
+        if locked_version:
+            version_line += f"- Locked Version: `{locked_version}` (.terraform.lock.hcl)\n"
+        
+        if modules:
+            module_lines = "- Recommended Modules:\n" + "".join([render_module(module) for module in modules[:3]])
+        else:
+            module_lines = "- Recommended Modules: ⚠️ None found\n"
+        
+        yield f"### {provider['namespace']}/{provider['name']}\n{version_line}{module_lines}\n"
+
+
+def render_resource_analysis(plan_analysis: Dict[str, Any], recommendations: List[str]) -> str:
+    """Render the best-practice recommendations and resource changes section."""
+    sections = ["## Resource Analysis\n"]
+    
+    if recommendations:
+        rec_lines = "".join([f"- {rec}\n" for rec in recommendations])
+        sections.append(f"### Recommendations\n{rec_lines}\n")
+    
+    # Show resource changes summary, grouped by action in the fixed action order
+    if plan_analysis['resources']:
+        sections.append("### Resource Changes\n")
+        by_action = plan_analysis['by_action']
+        for action in PLAN_ACTIONS:
+            resources_list = by_action.get(action)
+            if resources_list:
+                n_resources = len(resources_list)
+                resource_lines = "".join([f"- `{resource.type}.{resource.name}`\n" for resource in resources_list[:5]])  # Show first 5
+                more = f"- ... and {n_resources - 5} more\n" if n_resources > 5 else ""
+                sections.append(f"\n**{action.upper()}** ({n_resources} resource(s)):\n{resource_lines}{more}")
+        sections.append("\n")
+    
+    return "".join(sections)
+
+
+def render_ai_analysis(plan_analysis: Dict[str, Any], recommendations: List[str]) -> str:
+    """Render the AI analysis summary for a plan that has resource changes."""
+    resource_types = plan_analysis.get('resource_types') or []
+    n_resource_types = len(resource_types)
+    resource_summary = f"{plan_analysis['total_resources']} resource changes"
+    action_counts = zip(PLAN_ACTIONS, get_action_counts(plan_analysis['actions']))
+    action_summary = [f"{n} to {action}" for action, n in action_counts if n > 0]
+    
+    action_text = ", ".join(action_summary) if action_summary else "no changes"
+    
+    ai_parts = [f"""## Terraform Plan Analysis
+
+This plan includes:
+- {resource_summary} ({action_text})
+- {n_resource_types} unique resource type(s)
+- Provider validation completed via HashiCorp MCP Server
+
+### Infrastructure Changes:
+"""]
+    if resource_types:
+        ai_parts.append("- Resource types: " + ", ".join(resource_types[:5]))
+        if n_resource_types > 5:
+            ai_parts.append(f", and {n_resource_types - 5} more")
+        ai_parts.append("\n")
+    
+    ai_parts.append(AI_RECOMMENDATIONS)
+    
+    # Add best practice recommendations
+    if recommendations:
+        ai_parts.append("\n### Best Practices:\n")
+        ai_parts.extend([f"- {rec}\n" for rec in recommendations])
+    
+    return "".join(ai_parts)
+
+
+def write_outputs(plan_analysis: Dict[str, Any], providers: List[Dict[str, str]], locked_versions: Dict[str, str], resource_section: str, ai_analysis: str) -> None:
+    """Write the validation report and the AI analysis files."""
+    # Stream each report section to disk as it is rendered
+    with open_atomic("mcp_validation_report.txt", buffering=1 << 16) as f:
+        f.write(render_plan_summary(plan_analysis))
+        f.writelines(render_provider_validation(lookup_providers(providers, locked_versions)))
+        f.write(resource_section)
+    
+    logger.info("Validation complete!")
+    logger.info("Report written to: mcp_validation_report.txt")
+    
+    with open_atomic("ai_analysis.txt") as f:
+        f.write(ai_analysis)
+    
+    logger.info("AI analysis written to: ai_analysis.txt")
+
+
+def run_with_resources(plan_analysis: Dict[str, Any], providers: List[Dict[str, str]], locked_versions: Dict[str, str]) -> None:
+    """Produce the outputs for a plan with resource changes, including resource analysis."""
+    # Best practices feed both the report and the AI analysis, so work them out once
+    if providers:
+        recommendations = analyze_resource_best_practices(plan_analysis['type_counts'], providers)
+        resource_section = render_resource_analysis(plan_analysis, recommendations)
+    else:
+        recommendations = []
+        resource_section = ""
+    
+    write_outputs(plan_analysis, providers, locked_versions, resource_section, render_ai_analysis(plan_analysis, recommendations))
+
+
+def run_empty_plan(plan_analysis: Dict[str, Any], providers: List[Dict[str, str]], locked_versions: Dict[str, str]) -> None:
+    """Produce the outputs for an empty or failed plan."""
+    write_outputs(plan_analysis, providers, locked_versions, "", AI_ANALYSIS_EMPTY_PLAN)
+
+
 def main():
     """Main validation function."""
     plan_path = "tfplan.json"
     terraform_dir = "terraform"
     
-    # Validate plan file exists
-    if not os.path.exists(plan_path):
+    # Load the plan once; opening it directly avoids a separate existence check
+    try:
+        plan = load_plan(plan_path)
+    except FileNotFoundError:
         logger.error(f"Plan file not found: {plan_path}")
         logger.error("Please ensure terraform plan was run successfully.")
         sys.exit(1)
@@ -716,9 +1503,11 @@ def main():
         logger.error("  - Network connectivity issues")
         sys.exit(1)
     
-    # Extract providers
-    logger.info("Extracting providers from Terraform plan...")
-    providers = extract_providers_from_plan(plan_path, terraform_dir)
+    # Extract providers and analyze resources from a single parse of the plan
+    providers, plan_analysis = analyze_plan(plan, terraform_dir)
+    # Only the slim analysis is needed from here on; let the full plan tree be freed
+    # before the registry lookups and report generation
+    del plan
     
     if not providers:
         logger.warning("No providers found in plan or Terraform files")
@@ -728,178 +1517,18 @@ def main():
         logger.warning("  - Plan file is empty or malformed")
         # Don't exit - continue with empty provider list for reporting
     
-    # Analyze plan
-    logger.info("Analyzing Terraform plan...")
-    plan_analysis = analyze_plan_resources(plan_path)
-    
-    # Check if plan has actual resources (not empty)
-    plan_has_resources = plan_analysis['total_resources'] > 0
-    
-    # Generate validation report
-    report_lines = [
-        "# Terraform MCP Validation Report\n",
-        f"## Plan Summary\n",
-        f"- Total Resources: {plan_analysis['total_resources']}\n",
-        f"- Actions:\n",
-        f"  - Create: {plan_analysis['actions'].get('create', 0)}\n",
-        f"  - Update: {plan_analysis['actions'].get('update', 0)}\n",
-        f"  - Delete: {plan_analysis['actions'].get('delete', 0)}\n",
-        f"  - Replace: {plan_analysis['actions'].get('replace', 0)}\n",
-    ]
-    
-    # Add resource types if plan has resources
-    if plan_has_resources and plan_analysis.get('resource_types'):
-        report_lines.append(f"\n### Resource Types in Plan\n")
-        report_lines.append(f"- {len(plan_analysis['resource_types'])} unique resource type(s):\n")
-        for resource_type in plan_analysis['resource_types'][:10]:  # Limit to first 10
-            report_lines.append(f"  - `{resource_type}`\n")
-        if len(plan_analysis['resource_types']) > 10:
-            report_lines.append(f"  - ... and {len(plan_analysis['resource_types']) - 10} more\n")
-        report_lines.append("\n")
-    
-    report_lines.append("## Provider Validation\n")
-    
-    if not providers:
-        report_lines.append("⚠️ **Note**: No providers found in plan.\n\n")
-        report_lines.append("This usually indicates that `terraform plan` failed (e.g., missing AWS credentials).\n")
-        report_lines.append("Provider validation was attempted using fallback methods but no providers were found.\n\n")
-    else:
-        for provider in providers:
-            namespace = provider["namespace"]
-            name = provider["name"]
-            
-            logger.info(f"Validating provider: {namespace}/{name}")
-            
-            version = get_provider_version(namespace, name)
-            modules = search_modules(name, limit=3)
-            
-            report_lines.append(f"### {namespace}/{name}\n")
-            
-            if version:
-                report_lines.append(f"- Latest Version: `{version}`\n")
-            else:
-                report_lines.append(f"- Latest Version: ⚠️ Unable to determine\n")
-            
-            if modules:
-                report_lines.append(f"- Recommended Modules:\n")
-                for module in modules[:3]:
-                    # Prefer display_name if available, otherwise use name
-                    module_name = module.get("display_name") or module.get("name", "unknown")
-                    module_source = module.get("source", "")
-                    if module_source:
-                        report_lines.append(f"  - `{module_name}` ({module_source})\n")
-                    else:
-                        report_lines.append(f"  - `{module_name}`\n")
-            else:
-                report_lines.append(f"- Recommended Modules: ⚠️ None found\n")
-            
-            report_lines.append("\n")
-    
-    # Add resource-level analysis if plan has resources
-    if plan_has_resources and providers:
-        report_lines.append("## Resource Analysis\n")
-        
-        # Analyze best practices
-        recommendations = analyze_resource_best_practices(plan_analysis['resources'], providers)
-        if recommendations:
-            report_lines.append("### Recommendations\n")
-            for rec in recommendations:
-                report_lines.append(f"- {rec}\n")
-            report_lines.append("\n")
-        
-        # Show resource changes summary
-        if plan_analysis['resources']:
-            report_lines.append("### Resource Changes\n")
-            # Group by action type
-            by_action = {"create": [], "update": [], "delete": [], "replace": []}
-            for resource in plan_analysis['resources']:
-                actions = resource.get("actions", [])
-                for action in actions:
-                    if action in by_action:
-                        by_action[action].append(resource)
-            
-            for action, resources_list in by_action.items():
-                if resources_list:
-                    report_lines.append(f"\n**{action.upper()}** ({len(resources_list)} resource(s)):\n")
-                    for resource in resources_list[:5]:  # Show first 5
-                        report_lines.append(f"- `{resource['type']}.{resource['name']}`\n")
-                    if len(resources_list) > 5:
-                        report_lines.append(f"- ... and {len(resources_list) - 5} more\n")
-            report_lines.append("\n")
-    
-    # Write report
-    report_content = "".join(report_lines)
-    with open("mcp_validation_report.txt", "w") as f:
-        f.write(report_content)
+    # Providers from .tf files are keyed by local name, so two local names can
+    # share a source; look each namespace/name up only once
+    providers = list({(p["namespace"], p["name"]): p for p in providers}.values())
     
-    logger.info("Validation complete!")
-    logger.info("Report written to: mcp_validation_report.txt")
+    # Versions pinned by terraform init are reported next to the latest ones
+    locked_versions = load_lockfile(terraform_dir)
     
-    # Create AI analysis
+    # Pick the output path once: plans with resource changes get the full analysis
     if plan_analysis['total_resources'] > 0:
-        resource_summary = f"{plan_analysis['total_resources']} resource changes"
-        action_summary = []
-        if plan_analysis['actions'].get('create', 0) > 0:
-            action_summary.append(f"{plan_analysis['actions']['create']} to create")
-        if plan_analysis['actions'].get('update', 0) > 0:
-            action_summary.append(f"{plan_analysis['actions']['update']} to update")
-        if plan_analysis['actions'].get('delete', 0) > 0:
-            action_summary.append(f"{plan_analysis['actions']['delete']} to delete")
-        if plan_analysis['actions'].get('replace', 0) > 0:
-            action_summary.append(f"{plan_analysis['actions']['replace']} to replace")
-        
-        action_text = ", ".join(action_summary) if action_summary else "no changes"
-        
-        ai_analysis = f"""## Terraform Plan Analysis
-
-This plan includes:
-- {resource_summary} ({action_text})
-- {len(plan_analysis.get('resource_types', []))} unique resource type(s)
-- Provider validation completed via HashiCorp MCP Server
-
-### Infrastructure Changes:
-"""
-        if plan_analysis.get('resource_types'):
-            ai_analysis += "- Resource types: " + ", ".join(plan_analysis['resource_types'][:5])
-            if len(plan_analysis['resource_types']) > 5:
-                ai_analysis += f", and {len(plan_analysis['resource_types']) - 5} more"
-            ai_analysis += "\n"
-        
-        ai_analysis += """
-### Recommendations:
-1. Review provider versions to ensure you're using the latest stable versions
-2. Consider using recommended modules from the Terraform Registry
-3. Verify all resource configurations match the latest provider documentation
-4. Review resource changes carefully before applying
-"""
-        
-        # Add best practice recommendations
-        if providers:
-            recommendations = analyze_resource_best_practices(plan_analysis['resources'], providers)
-            if recommendations:
-                ai_analysis += "\n### Best Practices:\n"
-                for rec in recommendations:
-                    ai_analysis += f"- {rec}\n"
+        run_with_resources(plan_analysis, providers, locked_versions)
     else:
-        resource_summary = "No resource changes (plan may be empty or failed)"
-        ai_analysis = f"""## Terraform Plan Analysis
-
-This plan includes:
-- {resource_summary}
-- Provider validation completed via HashiCorp MCP Server
-
-### Recommendations:
-1. Review provider versions to ensure you're using the latest stable versions
-2. Consider using recommended modules from the Terraform Registry
-3. Verify all resource configurations match the latest provider documentation
-
-*Note: If the plan is empty, this may indicate missing AWS credentials. Configure AWS OIDC authentication to enable full plan generation.*
-"""
-    
-    with open("ai_analysis.txt", "w") as f:
-        f.write(ai_analysis)
-    
-    logger.info("AI analysis written to: ai_analysis.txt")
+        run_empty_plan(plan_analysis, providers, locked_versions)
 
 
 if __name__ == "__main__":